@@ -0,0 +1,128 @@
+import os
+import json
+import hashlib
+
+
+def get_cache_dir():
+    """
+    Gets the directory otto-bot caches compiled artifacts in.  Can be overridden with the `OTTO_BOT_CACHE_DIR`
+    environmental variable.
+    """
+    default_dir = os.path.join(os.path.expanduser("~"), ".otto-bot", "cache")
+    return os.environ.get("OTTO_BOT_CACHE_DIR", default_dir)
+
+
+def hash_bytes(data):
+    """
+    Hashes raw bytes with SHA-256.
+    :param data: bytes.  Content to hash.
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path):
+    """
+    Hashes the content of a file.
+    :param path: str.  Location of the file.
+    :return: The hex digest of the file or None if the file cannot be read.
+    """
+    try:
+        with open(path, "rb") as f:
+            return hash_bytes(f.read())
+    except OSError:
+        return None
+
+
+def canonical_hash(obj):
+    """
+    Hashes a JSON serializable object independent of key order and whitespace.
+    :param obj: A JSON serializable object.
+    """
+    return hash_bytes(json.dumps(obj, sort_keys=True, separators=(",", ":")).encode("utf-8"))
+
+
+def read_entry(namespace, key):
+    """
+    Reads a cached entry.
+    :param namespace: str.  Sub-directory of the cache the entry belongs to.
+    :param key: str.  Key identifying the entry.
+    :return: The cached object or None if there is no usable entry.
+    """
+    try:
+        with open(os.path.join(get_cache_dir(), namespace, key + ".json"), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_atomic(loc, content):
+    """
+    Writes a file by writing to a temporary file first and moving it into place, so concurrent readers never see a
+    partially written file.
+    :param loc: str.  Location of the file.
+    :param content: str.  Content to write.
+    """
+    tmp_loc = "{}.{}.tmp".format(loc, os.getpid())
+    with open(tmp_loc, "w") as f:
+        f.write(content)
+    os.replace(tmp_loc, loc)
+
+
+def write_entry(namespace, key, value):
+    """
+    Writes an entry to the cache.
+    :param namespace: str.  Sub-directory of the cache the entry belongs to.
+    :param key: str.  Key identifying the entry.
+    :param value: A JSON serializable object to cache.
+    """
+    entry_dir = os.path.join(get_cache_dir(), namespace)
+    os.makedirs(entry_dir, exist_ok=True)
+
+    write_atomic(os.path.join(entry_dir, key + ".json"), json.dumps(value))
+
+
+class TaskCache:
+
+    def __init__(self):
+        """
+        A content-addressed cache of task definitions.  Validation results are keyed by a hash of the task so they can
+        be reused across assistants and runs.  For every task deployed to an assistant the hash is recorded along with
+        the sid and last update time of the remote task, so unchanged tasks can be left in place on the next deploy.
+        """
+
+    def get_validation(self, key):
+        """
+        Gets the validation messages recorded for a task.
+        :param key: str.  Hash identifying the task.
+        :return: A list of validation messages or None if the task has not been validated.
+        """
+        entry = read_entry("validation", key)
+        return None if entry is None else entry["messages"]
+
+    def set_validation(self, key, messages):
+        """
+        Records the validation messages of a task.
+        :param key: str.  Hash identifying the task.
+        :param messages: list.  The messages reported while validating the task.
+        """
+        write_entry("validation", key, {"messages": messages})
+
+    @staticmethod
+    def deployed_key(assistant):
+        return canonical_hash({"account_sid": assistant.account_sid, "assistant_sid": assistant.sid})
+
+    def get_deployed(self, assistant):
+        """
+        Gets the records of the tasks last deployed to an assistant.
+        :param assistant: The Twilio AssistantInstance the tasks were deployed to.
+        :return: A dict mapping the unique name of each deployed task to its record.
+        """
+        return read_entry("deployed", self.deployed_key(assistant)) or {}
+
+    def set_deployed(self, assistant, task_records):
+        """
+        Records the tasks deployed to an assistant.
+        :param assistant: The Twilio AssistantInstance the tasks were deployed to.
+        :param task_records: dict.  Maps the unique name of each deployed task to its record.
+        """
+        write_entry("deployed", self.deployed_key(assistant), task_records)
@@ -1,8 +1,79 @@
 import click
 import json
+from datetime import timedelta
 from otto.validate import InputValidation
-from .utilities import setup_twilio_client, get_attribute_config_items, echo_format_msg, get_assistant_names
-from .resources import Assistant, FieldType, Task, ModelBuild
+from otto.config import CompiledConfig
+from otto.watch import ConfigWatcher
+from otto.events import reporter
+from otto.cache import TaskCache
+from .utilities import setup_twilio_client, get_attribute_config_items, echo, echo_format_msg, get_assistant_names
+from .resources import Assistant, FieldType, Task, ModelBuild, delete_resources, prune_model_builds, \
+    teardown_nested_resources, get_task_record
+
+
+def get_max_age(max_build_age):
+    """
+    Converts the `--max-build-age` option, given in days, into a timedelta.
+    :param max_build_age: int.  Age in days or None.
+    """
+    return None if max_build_age is None else timedelta(days=max_build_age)
+
+
+def reporting_options(command):
+    """
+    Adds the options for writing a structured event stream and a metrics file to a command.
+    """
+    command = click.option('--metrics-file', default=None,
+                           help="Write Prometheus metrics to this file when the command finishes.")(command)
+    command = click.option('--events', 'events_loc', default=None,
+                           help="Append JSON line progress events to this file.  Use - for stdout.")(command)
+    return command
+
+
+def add_language_stats(summary, language_stats, item_type):
+    """
+    Adds the per-language upload counts and timings of a resource to the deploy summary.
+    :param summary: dict.  The deploy summary keyed by language.
+    :param language_stats: dict.  The `language_stats` of a Task or FieldType after it was created.
+    :param item_type: str.  Either "samples" or "field_values".
+    """
+    for language, stats in language_stats.items():
+        language_summary = summary.setdefault(language, {"samples": 0, "field_values": 0, "seconds": 0.0})
+        language_summary[item_type] += stats["count"]
+        language_summary["seconds"] += stats["seconds"]
+
+
+def load_validated_config(config_loc, use_cache=True):
+    """
+    Compiles and validates a configuration file.  Validation is skipped when the compiled configuration is served from
+    the cache, since only configurations that passed validation are cached.  Exits if the configuration is invalid.
+
+    :param config_loc: Location of the configuration file.
+    :param use_cache: Boolean flag indicating if a cached compiled configuration can be used.
+    :return: A CompiledConfig object.
+    """
+    try:
+        compiled = CompiledConfig.load(config_loc, use_cache=use_cache)
+    except (OSError, ValueError) as e:
+        echo_format_msg("FAIL: Unable to compile {}. {}".format(config_loc, e))
+        exit()
+
+    if compiled.cached:
+        echo_format_msg("INFO: Configuration is unchanged since it last passed validation.")
+        return compiled
+
+    input_validation = InputValidation(compiled.config, use_cache=use_cache)
+
+    if not input_validation.validate_input():
+        echo("DEPLOY FAILED.  See above for areas to improve.", fg='red')
+        exit()
+    else:
+        echo("\n")
+        echo("VALIDATION PASSED!", fg="green")
+
+    compiled.save()
+
+    return compiled
 
 
 @click.group()
@@ -63,14 +134,27 @@ def init():
 @handler.command()
 @click.argument("config_loc")
 @click.option('--overwrite', default=False, is_flag=True)
-def deploy(config_loc, overwrite):
+@click.option('--no-cache', default=False, is_flag=True, help="Recompile and revalidate the configuration.")
+@click.option('--keep-builds', default=None, type=click.IntRange(min=1),
+              help="Number of most recent model builds to keep after deploying.")
+@click.option('--max-build-age', default=None, type=click.IntRange(min=0),
+              help="Keep model builds created within this many days after deploying.")
+@reporting_options
+def deploy(config_loc, overwrite, no_cache, keep_builds, max_build_age, events_loc, metrics_file):
     """
     Deploys a Twilio Autopilot model based on the configuration file provided.
 
     :param config_loc: Location of the configuration file to deploy.
     :param overwrite: Boolean flag indicating if a model should be overwritten if it exists.
+    :param no_cache: Boolean flag to ignore any cached compiled configuration.
+    :param keep_builds: Number of most recent model builds to retain once the deploy succeeds.
+    :param max_build_age: Model builds newer than this many days are retained once the deploy succeeds.
+    :param events_loc: Optional location to append JSON line progress events to.
+    :param metrics_file: Optional location to write Prometheus metrics to.
     :return:
     """
+    reporter.configure(events_loc, metrics_file)
+
     # Setup the Twilio client with the provided authorization.
     response = setup_twilio_client()
     if not response["STATUS"]:
@@ -80,65 +164,177 @@ def deploy(config_loc, overwrite):
     client = response["Payload"]
 
     # Load and validate the configuration file.
-    config = json.load(open(config_loc, "r"))
-    input_validation = InputValidation(config)
-
-    if not input_validation.validate_input():
-        click.echo(click.style("DEPLOY FAILED.  See above for areas to improve.", fg='red'), nl=True)
-        exit()
-    else:
-        click.echo("\n")
-        click.echo(click.style("VALIDATION PASSED!", fg="green"), nl=True)
+    config = load_validated_config(config_loc, use_cache=not no_cache).config
 
     # Get the assistant if it exists or create a new one.
     assistant = Assistant(client.autopilot, **config["assistant"])
+    tasks = [Task(**task_definition) for task_definition in get_attribute_config_items(config, "task__").values()]
+
+    # Tasks deployed to this assistant with the same content, and not changed on Twilio since, are left in place.
+    # Tasks using custom field types are always redeployed since their field types are recreated.
+    task_cache = TaskCache()
+    task_hashes = {task.unique_name: task.content_hash() for task in tasks}
+    unchanged_tasks = []
+
+    existing_assistant = assistant.fetch()
+    if existing_assistant is not None and not no_cache:
+        task_records = task_cache.get_deployed(existing_assistant)
+        remote_tasks = {t.unique_name: t for t in existing_assistant.tasks.list()}
+        unchanged_tasks = [task.unique_name for task in tasks
+                           if task.unique_name in remote_tasks and not task.uses_custom_field_types()
+                           and task_records.get(task.unique_name) ==
+                           get_task_record(remote_tasks[task.unique_name], task_hashes[task.unique_name])]
+        task_records = {name: task_records[name] for name in unchanged_tasks}
+    else:
+        task_records = {}
 
-    if (assistant.exists() is True) & (overwrite is False):
-        response = input("Assistant already exists."
-                         "Overwriting the assistant will create a new assistant based on your configuration, which"
-                         "could cause some existing resources to be deleted.\n\n"
-                         "Do you want to overwrite the existing assistant (y/n)? ")
+    if (existing_assistant is not None) & (overwrite is False):
+        echo("Assistant already exists."
+             "Overwriting the assistant will create a new assistant based on your configuration, which"
+             "could cause some existing resources to be deleted.\n\n"
+             "Do you want to overwrite the existing assistant (y/n)? ", nl=False)
+        response = input()
 
         if response.lower() != "y":
             msg = "DEPLOY FAILED: Assistant already exists.  You can overwrite the current assistant or create a new" \
                   "one with a different name."
-            click.echo(click.style(msg, fg="red"))
+            echo(msg, fg="red")
             exit()
 
-    assistant = assistant.fetch_or_create()
+    with reporter.timed("assistant", "deploy", name=assistant.unique_name):
+        assistant = assistant.fetch_or_create(keep_tasks=unchanged_tasks)
+
+    task_cache.set_deployed(assistant, task_records)
+
+    language_summary = {}
 
     # Setup any custom fields that are used by the assistant.
-    for field_type_key, field_type_definition in get_attribute_config_items(config, "field_types__").items():
-        field_type = FieldType(**field_type_definition).create(assistant)
+    for field_type_key, field_type_definition in get_attribute_config_items(config, "field_type__").items():
+        field_type = FieldType(**field_type_definition)
+        with reporter.timed("field_type", "create", name=field_type.unique_name):
+            field_type.create(assistant)
+        add_language_stats(language_summary, field_type.language_stats, "field_values")
         msg = "COMPLETED: Custom field type {} has been created.".format(field_type.unique_name)
         echo_format_msg(msg)
 
     # Add Tasks to the chatbot.
-    config_tasks = {k: v for (k, v) in config.items() if k.startswith("task__")}
-    for task_key, task_definition in config_tasks.items():
-        task = Task(**task_definition).create(assistant)
+    for task in tasks:
+        if task.unique_name in task_records:
+            msg = "COMPLETED: Task {} is unchanged and was not redeployed.".format(task.unique_name)
+            echo_format_msg(msg)
+            continue
+
+        with reporter.timed("task", "create", name=task.unique_name):
+            task.create(assistant)
+        add_language_stats(language_summary, task.language_stats, "samples")
+
+        task_records[task.unique_name] = get_task_record(assistant.tasks(task.unique_name).fetch(),
+                                                         task_hashes[task.unique_name])
+        task_cache.set_deployed(assistant, task_records)
         msg = "COMPLETED: Task {} has been created.".format(task.unique_name)
         echo_format_msg(msg)
 
     # Now train the model.
-    model = ModelBuild(**config.get("model")).create(assistant)
+    with reporter.timed("model_build", "create", name=config["model"]["unique_name"]):
+        model = ModelBuild(**config.get("model")).create(assistant)
     msg = "COMPLETED: Model {} has been created.".format(model.unique_name)
     echo_format_msg(msg)
 
+    # Apply the retention policy to older model builds.
+    with reporter.timed("model_build", "prune", name=assistant.unique_name):
+        pruned = ModelBuild(model.unique_name).prune(assistant, keep=keep_builds, max_age=get_max_age(max_build_age))
+    if pruned:
+        msg = "COMPLETED: Removed {} stale model build(s).".format(len(pruned))
+        echo_format_msg(msg)
+
+    # Summarize what was uploaded for each language.
+    for language, stats in sorted(language_summary.items()):
+        msg = "INFO: `{}` uploaded {} samples and {} field values in {:.2f}s.".\
+            format(language, stats["samples"], stats["field_values"], stats["seconds"])
+        echo_format_msg(msg)
+
     msg = "SUCCESS!  Your Twilio Autopilot Assistant '{}' has been deployed!".format(assistant.unique_name)
-    click.echo(click.style(msg, fg="green"))
+    echo(msg, fg="green")
+
+
+@handler.command(name="compile")
+@click.argument("config_loc")
+@click.option('--output', default=None, help="Write the compiled configuration to this file.")
+@click.option('--no-cache', default=False, is_flag=True, help="Recompile and revalidate the configuration.")
+def compile_config(config_loc, output, no_cache):
+    """
+    Resolves the includes of a configuration file, validates the result and caches the compiled form so later
+    deploys of an unchanged configuration skip parsing, merging and validation.
+
+    :param config_loc: Location of the configuration file to compile.
+    :param output: Optional location to write the compiled configuration to.
+    :param no_cache: Boolean flag to ignore any cached compiled configuration.
+    :return:
+    """
+    compiled = load_validated_config(config_loc, use_cache=not no_cache)
+
+    if output is not None:
+        compiled.dump(output)
+
+    msg = "SUCCESS! Configuration '{}' has been compiled.".format(config_loc)
+    echo(msg, fg="green")
+
+
+@handler.command()
+@click.argument("config_loc")
+@click.option('--interval', default=1.0, type=float, help="Seconds between checks for changed files.")
+@click.option('--debounce', default=10.0, type=float,
+              help="Seconds to wait for further changes before training a new model.")
+@click.option('--keep-builds', default=3, type=click.IntRange(min=1),
+              help="Number of most recent model builds to keep as new models are trained.")
+@click.option('--assume-deployed', default=False, is_flag=True,
+              help="Only push changes made after the watch starts.")
+@reporting_options
+def watch(config_loc, interval, debounce, keep_builds, assume_deployed, events_loc, metrics_file):
+    """
+    Watches a configuration file, its includes and any sample files and incrementally redeploys the resources that
+    change.  Model training is debounced so a burst of edits results in a single new model build.
+
+    :param config_loc: Location of the configuration file to watch.
+    :param interval: Seconds between checks for changed files.
+    :param debounce: Seconds without further changes before a new model is built.
+    :param keep_builds: Number of most recent model builds to keep as new models are trained.
+    :param assume_deployed: Boolean flag indicating the current configuration is already deployed.
+    :param events_loc: Optional location to append JSON line progress events to.
+    :param metrics_file: Optional location to write Prometheus metrics to.
+    :return:
+    """
+    reporter.configure(events_loc, metrics_file)
+
+    response = setup_twilio_client()
+    if not response["STATUS"]:
+        echo_format_msg(response["Message"])
+        exit()
+
+    client = response["Payload"]
+
+    watcher = ConfigWatcher(client, config_loc, interval=interval, debounce=debounce, keep_builds=keep_builds)
+    try:
+        watcher.run(assume_deployed=assume_deployed)
+    except KeyboardInterrupt:
+        echo("\nStopped watching '{}'.".format(config_loc), fg="green")
 
 
 @handler.command()
 @click.argument("autopilot_sid")
-def teardown(autopilot_sid):
+@reporting_options
+def teardown(autopilot_sid, events_loc, metrics_file):
     """
     Tears down an Autopilot bot working through the resource hierarchy.  All resources associated with the bot
     will be deleted.
 
     :param autopilot_sid: The unique identifier of the bot.
+    :param events_loc: Optional location to append JSON line progress events to.
+    :param metrics_file: Optional location to write Prometheus metrics to.
     :return:
     """
+    reporter.configure(events_loc, metrics_file)
+
     response = setup_twilio_client()
     if not response["STATUS"]:
         echo_format_msg(response["Message"])
@@ -160,31 +356,75 @@ def teardown(autopilot_sid):
     # Begin by removing tasks.
     for t in assistant.tasks.list():
 
-        # Remove all samples.
-        for s in t.samples.list():
-            s.delete()
-
-        # Remove all fields.
-        for f in t.fields.list():
-            f.delete()
-        t.delete()
+        # Remove all samples and fields.
+        with reporter.timed("task", "delete", name=t.unique_name):
+            teardown_nested_resources(t, Task.NESTED_RESOURCES)
+            t.delete()
 
     # Remove any custom field types.
     for field_type in assistant.field_types.list():
-
-        for field_value in field_type.field_values.list():
-            field_value.delete()
-
-        field_type.delete()
+        with reporter.timed("field_type", "delete", name=field_type.unique_name):
+            teardown_nested_resources(field_type, FieldType.NESTED_RESOURCES)
+            field_type.delete()
 
     # Remove models.
-    for model in assistant.model_builds.list():
-        model.delete()
+    with reporter.timed("model_build", "delete", name=autopilot_sid):
+        delete_resources(assistant.model_builds.list(), resource_type="model_build")
 
-    assistant.delete()
+    with reporter.timed("assistant", "delete", name=autopilot_sid):
+        assistant.delete()
+    TaskCache().set_deployed(assistant, {})
 
     msg = "SUCCESS! The '{}' assistant and all of its related resources have been deleted.".format(autopilot_sid)
-    click.echo(click.style(msg, fg="green"))
+    echo(msg, fg="green")
+
+
+@handler.command()
+@click.option('--keep-builds', default=None, type=click.IntRange(min=1),
+              help="Number of most recent model builds to keep for each assistant.")
+@click.option('--max-build-age', default=None, type=click.IntRange(min=0),
+              help="Keep model builds created within this many days.")
+@click.option('--assistant', 'assistant_names', multiple=True,
+              help="Only clean up the named assistant.  Can be repeated.  Defaults to every assistant.")
+@reporting_options
+def gc(keep_builds, max_build_age, assistant_names, events_loc, metrics_file):
+    """
+    Removes stale model builds across the assistants in the account according to a retention policy.  The most
+    recent builds (`--keep-builds`) and any builds newer than `--max-build-age` days are kept.
+
+    :param keep_builds: Number of most recent model builds to retain for each assistant.
+    :param max_build_age: Model builds newer than this many days are retained.
+    :param assistant_names: Unique names of the assistants to clean up.  All assistants if none are given.
+    :param events_loc: Optional location to append JSON line progress events to.
+    :param metrics_file: Optional location to write Prometheus metrics to.
+    :return:
+    """
+    reporter.configure(events_loc, metrics_file)
+
+    if keep_builds is None and max_build_age is None:
+        echo_format_msg("FAIL: Provide a retention policy with --keep-builds and/or --max-build-age.")
+        exit()
+
+    response = setup_twilio_client()
+    if not response["STATUS"]:
+        echo_format_msg(response["Message"])
+        exit()
+
+    client = response["Payload"]
+
+    total = 0
+    for assistant in client.autopilot.assistants.list():
+        if assistant_names and assistant.unique_name not in assistant_names:
+            continue
+
+        with reporter.timed("model_build", "prune", name=assistant.unique_name):
+            pruned = prune_model_builds(assistant, keep=keep_builds, max_age=get_max_age(max_build_age))
+        total += len(pruned)
+        msg = "COMPLETED: Removed {} stale model build(s) from '{}'.".format(len(pruned), assistant.unique_name)
+        echo_format_msg(msg)
+
+    msg = "SUCCESS! {} stale model build(s) have been deleted.".format(total)
+    echo(msg, fg="green")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,149 @@
+import os
+import json
+from otto.cache import hash_bytes, hash_file, canonical_hash, read_entry, write_entry
+
+# Key listing the configuration files a configuration is layered on top of.
+INCLUDE_KEY = "includes"
+
+# Bump when the compiled form changes so older cache entries are ignored.
+COMPILE_FORMAT = 3
+
+
+def merge_config(base, overlay):
+    """
+    Deep merges an overlay configuration on top of a base configuration.  Nested objects are merged key by key, any
+    other value (including lists) in the overlay replaces the base value and a `null` value removes the key.
+    :param base: dict.  Base configuration.
+    :param overlay: dict.  Configuration whose values take precedence.
+    :return: A new merged dict.
+    """
+    merged = dict(base)
+    for k, v in overlay.items():
+        if v is None:
+            merged.pop(k, None)
+        elif isinstance(v, dict) and isinstance(merged.get(k), dict):
+            merged[k] = merge_config(merged[k], v)
+        else:
+            merged[k] = v
+
+    return merged
+
+
+def load_samples_file(samples_loc, inputs=None):
+    """
+    Reads a file of task samples, one sample per line.  Blank lines are ignored.
+    :param samples_loc: str.  Location of the samples file.
+    :param inputs: dict.  Collects the location and hash of the file.
+    :return: A list of samples.
+    """
+    with open(samples_loc, "rb") as f:
+        content = f.read()
+
+    if inputs is not None:
+        inputs[os.path.abspath(samples_loc)] = hash_bytes(content)
+
+    return [line.strip() for line in content.decode("utf-8").splitlines() if line.strip()]
+
+
+def resolve_config(config_loc, inputs=None, include_stack=()):
+    """
+    Reads a configuration file and resolves its includes.  Includes are merged in the order listed, with the
+    including file applied last as the overlay.  A task's `samples`, or the samples of one of its languages, can also be
+    the path to a file of samples.  Include and sample paths are relative to the file that lists them.
+    :param config_loc: str.  Location of the configuration file.
+    :param inputs: dict.  Collects the location and hash of every file read while resolving.
+    :param include_stack: tuple.  Files currently being resolved, used to detect include cycles.
+    :return: The resolved configuration dict.
+    """
+    config_loc = os.path.abspath(config_loc)
+    if config_loc in include_stack:
+        raise ValueError("Configuration file {} includes itself.".format(config_loc))
+
+    with open(config_loc, "rb") as f:
+        content = f.read()
+
+    if inputs is not None:
+        inputs[config_loc] = hash_bytes(content)
+
+    config = json.loads(content.decode("utf-8"))
+    if not isinstance(config, dict):
+        raise ValueError("Configuration file {} must contain a JSON object.".format(config_loc))
+
+    includes = config.pop(INCLUDE_KEY, [])
+    if isinstance(includes, str):
+        includes = [includes]
+    elif not (isinstance(includes, list) and all(isinstance(loc, str) for loc in includes)):
+        raise ValueError("The `{}` of {} must be a path or a list of paths.".format(INCLUDE_KEY, config_loc))
+
+    for k, v in config.items():
+        if not (k.startswith("task__") and isinstance(v, dict)):
+            continue
+
+        if isinstance(v.get("samples"), str):
+            v["samples"] = load_samples_file(os.path.join(os.path.dirname(config_loc), v["samples"]), inputs)
+        elif isinstance(v.get("samples"), dict):
+            for language, samples in v["samples"].items():
+                if isinstance(samples, str):
+                    samples_loc = os.path.join(os.path.dirname(config_loc), samples)
+                    v["samples"][language] = load_samples_file(samples_loc, inputs)
+
+    resolved = {}
+    for include_loc in includes:
+        include_loc = os.path.join(os.path.dirname(config_loc), include_loc)
+        resolved = merge_config(resolved, resolve_config(include_loc, inputs, include_stack + (config_loc,)))
+
+    return merge_config(resolved, config)
+
+
+class CompiledConfig:
+
+    def __init__(self, config_loc, config, inputs, cached=False):
+        """
+        The canonical form of a configuration file with all of its includes resolved.  Once a compiled configuration
+        passes validation it is cached on disk and reused for as long as none of its input files change.
+
+        :param config_loc: str.  Location of the configuration file.
+        :param config: dict.  The resolved configuration.
+        :param inputs: dict.  Location and hash of every file the configuration was compiled from.
+        :param cached: bool.  Indicates the configuration was loaded from the cache.
+        """
+        self.config_loc = os.path.abspath(config_loc)
+        self.config = config
+        self.inputs = inputs
+        self.cached = cached
+
+    @staticmethod
+    def cache_key(config_loc):
+        return canonical_hash({"format": COMPILE_FORMAT, "config_loc": os.path.abspath(config_loc)})
+
+    @classmethod
+    def load(cls, config_loc, use_cache=True):
+        """
+        Compiles a configuration file, returning the cached compiled form if none of its inputs have changed.
+        :param config_loc: str.  Location of the configuration file.
+        :param use_cache: bool.  Set to False to always recompile.
+        :return: A CompiledConfig object.
+        """
+        if use_cache:
+            entry = read_entry("compiled", cls.cache_key(config_loc))
+            if entry is not None and all(hash_file(loc) == h for (loc, h) in entry["inputs"].items()):
+                return cls(config_loc, entry["config"], entry["inputs"], cached=True)
+
+        inputs = {}
+        config = resolve_config(config_loc, inputs)
+
+        return cls(config_loc, config, inputs)
+
+    def save(self):
+        """
+        Caches the compiled configuration.  Should only be called once the configuration has passed validation.
+        """
+        write_entry("compiled", self.cache_key(self.config_loc), {"inputs": self.inputs, "config": self.config})
+
+    def dump(self, output_loc):
+        """
+        Writes the compiled configuration as a standalone configuration file.
+        :param output_loc: str.  Location to write the file to.
+        """
+        with open(output_loc, "w") as f:
+            json.dump(self.config, f, indent=2, sort_keys=True)
@@ -0,0 +1,149 @@
+import sys
+import json
+import time
+import atexit
+from threading import Lock
+from contextlib import contextmanager
+from otto.cache import write_atomic
+
+
+class EventReporter:
+
+    def __init__(self):
+        """
+        Records the progress of otto-bot commands.  Every action on a resource can be written as a JSON line to an
+        event stream, and the calls, errors, retries and durations of each action are tallied so they can be exported
+        in the Prometheus text format.
+        """
+        self.events_file = None
+        self.events_stdout = False
+        self.metrics_loc = None
+        self.calls = {}
+        self.errors = {}
+        self.retries = {}
+        self.durations = {}
+        self.lock = Lock()
+
+    def configure(self, events_loc=None, metrics_loc=None):
+        """
+        Sets where events and metrics are written.  Metrics are written when the command exits.  When events are
+        written to stdout, `echo` sends all other output to stderr so stdout only carries JSON lines.
+        :param events_loc: str.  File to append JSON line events to.  Use "-" for stdout.
+        :param metrics_loc: str.  File to write Prometheus metrics to.
+        """
+        if events_loc == "-":
+            self.events_file = sys.stdout
+            self.events_stdout = True
+        elif events_loc is not None:
+            self.events_file = open(events_loc, "a")
+
+        self.metrics_loc = metrics_loc
+        atexit.register(self.close)
+
+    def emit(self, resource, action, status, duration=None, **details):
+        """
+        Writes an event to the event stream.
+        :param resource: str.  Type of resource acted on (i.e. task, field_type, model_build).
+        :param action: str.  Action taken on the resource (i.e. create, delete, prune).
+        :param status: str.  Outcome of the action, one of "success", "error" or "retry".
+        :param duration: float.  Seconds the action took.
+        :param details: Any other JSON serializable details about the event.
+        """
+        if self.events_file is None:
+            return
+
+        event = {"timestamp": time.time(), "resource": resource, "action": action, "status": status,
+                 "duration": duration}
+        event.update(details)
+
+        with self.lock:
+            self.events_file.write(json.dumps(event) + "\n")
+            self.events_file.flush()
+
+    def record_retry(self, resource, action):
+        """
+        Counts a retried call.
+        :param resource: str.  Type of resource acted on.
+        :param action: str.  Action that was retried.
+        """
+        with self.lock:
+            self.retries[(resource, action)] = self.retries.get((resource, action), 0) + 1
+
+        self.emit(resource, action, "retry")
+
+    @contextmanager
+    def timed(self, resource, action, **details):
+        """
+        Times an action, counting it as a call and as an error if it raises an exception, and emits an event once the
+        action finishes.
+        :param resource: str.  Type of resource acted on.
+        :param action: str.  Action taken on the resource.
+        :param details: Any other JSON serializable details about the event.
+        """
+        key = (resource, action)
+        start = time.time()
+        status = "error"
+        try:
+            yield
+            status = "success"
+        finally:
+            duration = time.time() - start
+            with self.lock:
+                self.calls[key] = self.calls.get(key, 0) + 1
+                if status == "error":
+                    self.errors[key] = self.errors.get(key, 0) + 1
+                self.durations[key] = self.durations.get(key, 0.0) + duration
+
+            self.emit(resource, action, status, duration, **details)
+
+    def format_metrics(self):
+        """
+        Formats the tallied metrics in the Prometheus text exposition format.  The output can be read by the node
+        exporter textfile collector or pushed to a Pushgateway.
+        """
+        counters = [
+            ("otto_bot_calls_total", "Number of actions taken on resources.", self.calls),
+            ("otto_bot_errors_total", "Number of actions that failed.", self.errors),
+            ("otto_bot_retries_total", "Number of calls retried after being rate limited.", self.retries),
+        ]
+        sample_format = '{}{{resource="{}",action="{}"}} {}'
+
+        lines = []
+        with self.lock:
+            for name, description, values in counters:
+                lines.append("# HELP {} {}".format(name, description))
+                lines.append("# TYPE {} counter".format(name))
+                for (resource, action), value in sorted(values.items()):
+                    lines.append(sample_format.format(name, resource, action, value))
+
+            # Durations are exposed as a summary, which pairs the total seconds with the number of actions timed.
+            lines.append("# HELP otto_bot_duration_seconds Seconds spent on actions.")
+            lines.append("# TYPE otto_bot_duration_seconds summary")
+            for (resource, action), value in sorted(self.durations.items()):
+                lines.append(sample_format.format("otto_bot_duration_seconds_sum", resource, action, value))
+                lines.append(sample_format.format("otto_bot_duration_seconds_count", resource, action,
+                                                  self.calls[(resource, action)]))
+
+        return "\n".join(lines) + "\n"
+
+    def write_metrics(self):
+        """
+        Writes the metrics file, if configured.  The file is replaced atomically so a collector never reads a partially
+        written file.
+        """
+        if self.metrics_loc is not None:
+            write_atomic(self.metrics_loc, self.format_metrics())
+
+    def close(self):
+        """
+        Writes the metrics file, if configured, and closes the event stream.
+        """
+        self.write_metrics()
+        self.metrics_loc = None
+
+        if self.events_file is not None and not self.events_stdout:
+            self.events_file.close()
+        self.events_file = None
+
+
+reporter = EventReporter()
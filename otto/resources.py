@@ -1,17 +1,176 @@
 import re
+import time
 import logging
+from itertools import zip_longest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from threading import Lock
 from twilio.base.exceptions import TwilioRestException
 from otto.utilities import get_attribute_config_items
+from otto.events import reporter
+from otto.cache import canonical_hash
 
 
 def get_resource_params(resource_obj, params):
     return {k: v for (k, v) in resource_obj.items() if k in params}
 
 
+MAX_WORKERS = 8
+
+# Number of times a rate limited call is retried before giving up.
+MAX_RETRIES = 3
+
+DEFAULT_LANGUAGE = "en-US"
+
+# Model builds in these states are still training and are never removed by a retention policy.
+ACTIVE_BUILD_STATUSES = ["enqueued", "building"]
+
+
+def call_with_retry(func, resource_type, action):
+    """
+    Calls the Twilio API, backing off and retrying when the call is rate limited.
+    :param func: Function making the API call.
+    :param resource_type: str.  Type of resource the call acts on, used to record retries.
+    :param action: str.  Action the call takes, used to record retries.
+    :return: The result of the call.
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            return func()
+        except TwilioRestException as e:
+            if e.status != 429 or attempt == MAX_RETRIES:
+                raise
+
+            reporter.record_retry(resource_type, action)
+            time.sleep(2 ** attempt)
+
+
+def delete_resources(resources, max_workers=MAX_WORKERS, resource_type="resource"):
+    """
+    Deletes a collection of Twilio resources concurrently.
+    :param resources: Iterable of Twilio instance objects exposing a `delete` method.
+    :param max_workers: int.  Maximum number of deletes issued at the same time.
+    :param resource_type: str.  Type of the resources, used to record retries.
+    :return: The number of resources deleted.
+    """
+    resources = list(resources)
+    if not resources:
+        return 0
+
+    def delete(resource_obj):
+        return call_with_retry(resource_obj.delete, resource_type, "delete")
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(resources))) as executor:
+        list(executor.map(delete, resources))
+
+    return len(resources)
+
+
+def group_by_language(items, item_key):
+    """
+    Groups samples or field values by language.  Items can be a list, where each item is a string in the default
+    language or a dict with its own `language`, or a dict mapping each language to a list of items.
+    :param items: list or dict.  The items to group.
+    :param item_key: str.  Name of the text attribute when an item is given as a string (`tagged_text` or `value`).
+    :return: A dict mapping each language to a list of item parameter dicts.
+    """
+    if isinstance(items, dict):
+        language_items = items.items()
+    else:
+        language_items = [(DEFAULT_LANGUAGE, items or [])]
+
+    groups = {}
+    for language, group in language_items:
+        for item in group:
+            params = dict(item) if isinstance(item, dict) else {item_key: item}
+            params.setdefault("language", language)
+            groups.setdefault(params["language"], []).append(params)
+
+    return groups
+
+
+def create_by_language(groups, create, max_workers=MAX_WORKERS, resource_type="resource"):
+    """
+    Creates resources grouped by language.  The uploads of every language are interleaved on a shared pool so the
+    languages are uploaded in parallel rather than one after another.
+    :param groups: dict.  Maps each language to a list of item parameter dicts.
+    :param create: Function creating the resource for an item parameter dict.
+    :param max_workers: int.  Maximum number of creates issued at the same time.
+    :param resource_type: str.  Type of the resources, used to record retries.
+    :return: A dict mapping each language to the number of items created and the seconds taken to create them.
+    """
+    stats = {language: {"count": len(group), "seconds": 0.0} for (language, group) in groups.items()}
+    spans = {}
+    spans_lock = Lock()
+
+    def timed_create(language, params):
+        start = time.time()
+        call_with_retry(lambda: create(params), resource_type, "create")
+        end = time.time()
+        with spans_lock:
+            first, last = spans.get(language, (start, end))
+            spans[language] = (min(first, start), max(last, end))
+
+    # Round robin across the languages so each language makes progress at the same time.
+    language_jobs = [[(language, params) for params in group] for (language, group) in groups.items()]
+    jobs = [job for batch in zip_longest(*language_jobs) for job in batch if job is not None]
+    if jobs:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(jobs))) as executor:
+            list(executor.map(lambda job: timed_create(*job), jobs))
+
+    for language, (first, last) in spans.items():
+        stats[language]["seconds"] = last - first
+
+    return stats
+
+
+def get_task_record(task_instance, content_hash):
+    """
+    Records a deployed task.  Along with the content hash, the sid and last update time of the remote task are kept so a
+    task recreated or edited on Twilio since it was deployed is not mistaken for an unchanged task.
+    :param task_instance: The Twilio TaskInstance that was deployed.
+    :param content_hash: str.  The `content_hash` of the Task that was deployed.
+    """
+    return {"hash": content_hash, "sid": task_instance.sid, "date_updated": str(task_instance.date_updated)}
+
+
 def teardown_nested_resources(base_resource, nested_resources):
     for resource_type in nested_resources:
-        for resource_obj in getattr(base_resource, resource_type).list():
-            resource_obj.delete()
+        delete_resources(getattr(base_resource, resource_type).list(), resource_type=resource_type.rstrip("s"))
+
+
+def prune_model_builds(assistant, keep=None, max_age=None, protected=None):
+    """
+    Applies a retention policy to the model builds of an assistant.  A build is retained if it is one of the `keep`
+    most recent builds or if it is newer than `max_age`.  The newest completed build, builds that are still training
+    and builds named in `protected` are always retained, so an assistant is never left without a trained model.  If no
+    policy is given nothing is deleted.
+
+    :param assistant: The assistant object to prune model builds from.
+    :param keep: int.  Number of most recent model builds to retain.
+    :param max_age: timedelta.  Model builds created within this window are retained.
+    :param protected: list.  Unique names of model builds that must never be deleted.
+    :return: List of the unique names of the model builds that were deleted.
+    """
+    if keep is None and max_age is None:
+        return []
+
+    builds = sorted(assistant.model_builds.list(), key=lambda b: b.date_created, reverse=True)
+
+    retained = set(b.sid for b in builds if b.unique_name in (protected or []) or b.status in ACTIVE_BUILD_STATUSES)
+    completed = [b for b in builds if b.status == "completed"]
+    if completed:
+        retained.add(completed[0].sid)
+    if keep is not None:
+        retained.update(b.sid for b in builds[:keep])
+    if max_age is not None:
+        cutoff = datetime.now(timezone.utc) - max_age
+        retained.update(b.sid for b in builds if b.date_created >= cutoff)
+
+    stale = [b for b in builds if b.sid not in retained]
+    delete_resources(stale, resource_type="model_build")
+
+    return [b.unique_name for b in stale]
 
 
 class Assistant:
@@ -64,17 +223,25 @@ class Assistant:
         Checks whether an assistant exists.
         :return: Boolean indicating if the object exists or not.
         """
+        return self.fetch() is not None
+
+    def fetch(self):
+        """
+        Fetches the assistant if it exists.
+        :return: A Twilio AssistantInstance object or None if the assistant does not exist.
+        """
         try:
-            self.twilio_client.assistants(self.unique_name).fetch()
-            return True
+            return self.twilio_client.assistants(self.unique_name).fetch()
         except TwilioRestException:
-            return False
+            return None
 
-    def fetch_or_create(self):
+    def fetch_or_create(self, teardown=True, keep_tasks=None):
         """
         If an assistant exists then update the assistant with the current parameters and returns the Assistant.
 
         If the assistant does not exist then create it based on the current values.
+        :param teardown: bool.  Remove the existing tasks and field types of an assistant that already exists.
+        :param keep_tasks: list.  Unique names of existing tasks to leave in place when tearing down.
         :return: A Twilio AssistantInstance object.
         """
         assistant_params = get_resource_params(self.__dict__, self.RESOURCE_PARAMS)
@@ -83,11 +250,13 @@ class Assistant:
             assistant = self.twilio_client.assistants(self.unique_name).fetch()
 
             # Remove any existing tasks and fields from current assistant.
-            for task in assistant.tasks.list():
-                Task(task.unique_name).teardown(assistant)
+            if teardown:
+                for task in assistant.tasks.list():
+                    if task.unique_name not in (keep_tasks or []):
+                        Task(task.unique_name).teardown(assistant)
 
-            for field_type in assistant.field_types.list():
-                FieldType(field_type.unique_name).teardown(assistant)
+                for field_type in assistant.field_types.list():
+                    FieldType(field_type.unique_name).teardown(assistant)
 
             return self.twilio_client.assistants(assistant.sid).update(**assistant_params)
         except TwilioRestException:
@@ -107,7 +276,7 @@ class Task:
 
         :param unique_name: str.  Unique name assigned to the task.
         :param samples: list or dict.  Samples to train the task against.  If list is provided will assume language is
-            'en-US' by default.
+            'en-US' by default.  A dict maps each language to its list of samples.
         :param friendly_name: str.  Friendly name defining the task.
         :param actions: dict.  Expects "actions" as a key and then a list of actions defining the task.
         :param actions_url: URL where the task can fetch actions.
@@ -119,6 +288,7 @@ class Task:
         self.actions = actions
         self.actions_url = actions_url
         self.task_fields = task_fields
+        self.language_stats = {}
 
     def create(self, assistant):
         """
@@ -144,14 +314,14 @@ class Task:
                 if tf.unique_name not in defined_fields:
                     defined_fields.append(tf.unique_name)
 
-        custom_fields = []
-        for sample in self.samples:
-            if isinstance(sample, dict):
-                s = Sample(**sample).create(task)
-            else:
-                s = Sample(tagged_text=sample).create(task)
+        # Upload the samples of each language in parallel batches.
+        language_samples = group_by_language(self.samples, "tagged_text")
+        self.language_stats = create_by_language(language_samples, lambda params: Sample(**params).create(task),
+                                                 resource_type="sample")
 
-            for custom_field in re.findall(r"\{(\w+)\}", s.tagged_text):
+        custom_fields = []
+        for sample in [params for group in language_samples.values() for params in group]:
+            for custom_field in re.findall(r"\{(\w+)\}", sample["tagged_text"]):
                 if custom_field not in custom_fields:
                     custom_fields.append(custom_field)
 
@@ -164,6 +334,23 @@ class Task:
 
         return task
 
+    def content_hash(self):
+        """
+        Hashes everything `create` sends for the task, so identical tasks have the same hash regardless of which
+        assistant or configuration they come from.
+        """
+        task_definition = get_resource_params(self.__dict__, self.RESOURCE_PARAMS)
+        task_definition["samples"] = group_by_language(self.samples, "tagged_text")
+        task_definition["task_fields"] = self.task_fields or []
+
+        return canonical_hash(task_definition)
+
+    def uses_custom_field_types(self):
+        """
+        Checks if any of the task fields use a custom field type rather than a built-in Twilio field type.
+        """
+        return any(not tf.get("field_type", "").startswith("Twilio.") for tf in self.task_fields or [])
+
     def teardown(self, assistant):
         """
         Deletes a Task along with any other nested resources (samples and fields) associated with it.
@@ -179,7 +366,7 @@ class Task:
 
 class Sample:
 
-    def __init__(self, tagged_text, language="en-US", source_channel=None):
+    def __init__(self, tagged_text, language=DEFAULT_LANGUAGE, source_channel=None):
         """
         A Sample is associated with a Task and is used for training your assistant.  A sample represents a way that
         a user might express themselves to complete the task.
@@ -228,6 +415,16 @@ class ModelBuild:
 
         return model
 
+    def prune(self, assistant, keep=None, max_age=None):
+        """
+        Removes stale model builds from the assistant while always retaining this model.
+        :param assistant: Assistant object to remove model builds from.
+        :param keep: int.  Number of most recent model builds to retain.
+        :param max_age: timedelta.  Model builds created within this window are retained.
+        :return: List of the unique names of the model builds that were deleted.
+        """
+        return prune_model_builds(assistant, keep=keep, max_age=max_age, protected=[self.unique_name])
+
 
 class TaskField:
 
@@ -264,12 +461,14 @@ class FieldType:
         Twilio Documentation: https://www.twilio.com/docs/autopilot/api/field-type
 
         :param unique_name: str.  Unique name to assign to the
-        :param values:
+        :param values: list or dict.  Values of the field type.  If list is provided will assume language is 'en-US' by
+            default.  A dict maps each language to its list of values.
         :param friendly_name:
         """
         self.unique_name = unique_name
         self.field_values = values
         self.friendly_name = friendly_name
+        self.language_stats = {}
 
     def create(self, assistant):
         """
@@ -287,11 +486,21 @@ class FieldType:
         # Remove any existing samples and fields.
         teardown_nested_resources(field_type, self.NESTED_RESOURCES)
 
-        for fv in self.field_values or []:
-            if isinstance(fv, dict):
-                FieldValue(**fv).create(field_type)
-            else:
-                FieldValue(value=fv).create(field_type)
+        # A synonym refers to another value of the field type, so synonyms are only created once every other value
+        # exists.
+        language_values = group_by_language(self.field_values, "value")
+        self.language_stats = {}
+        for is_synonym in [False, True]:
+            groups = {language: [params for params in group if bool(params.get("synonym_of")) == is_synonym]
+                      for (language, group) in language_values.items()}
+            stats = create_by_language({language: group for (language, group) in groups.items() if group},
+                                       lambda params: FieldValue(**params).create(field_type),
+                                       resource_type="field_value")
+
+            for language, language_stats in stats.items():
+                total = self.language_stats.setdefault(language, {"count": 0, "seconds": 0.0})
+                total["count"] += language_stats["count"]
+                total["seconds"] += language_stats["seconds"]
 
         return field_type
 
@@ -310,7 +519,7 @@ class FieldType:
 
 class FieldValue:
 
-    def __init__(self, value, language="en-US", synonym_of=None):
+    def __init__(self, value, language=DEFAULT_LANGUAGE, synonym_of=None):
         """
         Values to associate with a custom Field Type
 
@@ -2,6 +2,7 @@ import os
 import click
 from twilio.rest import Client
 from twilio.base.exceptions import TwilioException
+from otto.events import reporter
 
 
 def get_attribute_config_items(config, attribute):
@@ -44,6 +45,16 @@ def get_assistant_names(client):
     return [assistant.unique_name for assistant in client.autopilot.assistants.list()]
 
 
+def echo(msg, fg=None, nl=True):
+    """
+    Displays a message to the user.  Messages go to stderr when progress events are written to stdout.
+    :param msg: Text of the message.
+    :param fg: Color of the message.
+    :param nl: Boolean flag indicating if a newline is added after the message.
+    """
+    click.echo(click.style(msg, fg=fg), nl=nl, err=reporter.events_stdout)
+
+
 def echo_format_msg(msg):
     """
     Colors a message according to the status that is implied.
@@ -51,6 +62,7 @@ def echo_format_msg(msg):
     """
     color_map = {
         "INFO": "blue",
+        "WARN": "yellow",
         "FAIL": "red",
         "COMPLETED": "green",
         "SUCCESS": "green"
@@ -58,4 +70,4 @@ def echo_format_msg(msg):
 
     intent = msg.split(":")[0]
 
-    click.echo(click.style(msg, fg=color_map[intent]), nl=True)
+    echo(msg, fg=color_map.get(intent))
@@ -1,14 +1,26 @@
 import re
-import click
 from collections import Counter
-from otto.utilities import echo_format_msg
+from otto.utilities import echo, echo_format_msg
+from otto.cache import TaskCache, canonical_hash
+
+# Bump when the validation rules change so cached task validation results are ignored.
+VALIDATION_FORMAT = 1
 
 
 class InputValidation:
 
-    def __init__(self, config):
+    def __init__(self, config, use_cache=False):
         self.config = config
         self.validation_pass = True
+        self.messages = []
+        self.task_cache = TaskCache() if use_cache else None
+
+    def report(self, msg):
+        """
+        Displays a validation message and records it.
+        """
+        echo_format_msg(msg)
+        self.messages.append(msg)
 
     def required_parameters(self):
         """
@@ -17,19 +29,19 @@ class InputValidation:
             - At least 1 task resource.
             - A Model Build resource.
         """
-        click.echo("CHECKING BASE FILE FORMAT....")
+        echo("CHECKING BASE FILE FORMAT....")
         required_tags = ["assistant", "model"]
         missing_tags = list(set(required_tags) - set(self.config.keys()))
 
         if missing_tags:
             missing_str = ", ".join(missing_tags)
             msg = "FAIL: Configuration file is missing the required element(s): {}".format(missing_str)
-            echo_format_msg(msg)
+            self.report(msg)
             self.validation_pass = False
 
         if not any(k.startswith("task__") for k in self.config.keys()):
             msg = "FAIL: Your Assistant has no tasks defined.  Must have at least 1 task."
-            echo_format_msg(msg)
+            self.report(msg)
             self.validation_pass = False
 
     def validate_task(self, lbl, task):
@@ -43,10 +55,10 @@ class InputValidation:
         """
         if "actions" not in task:
             msg = "INFO: Task `{}` has no actions associated with it.".format(lbl)
-            echo_format_msg(msg)
+            self.report(msg)
         elif "actions" not in task["actions"]:
             msg = "FAIL: Actions object in task `{}` is misformed.".format(lbl)
-            echo_format_msg(msg)
+            self.report(msg)
             self.validation_pass = False
         else:
             task_actions = task["actions"]["actions"]
@@ -61,7 +73,7 @@ class InputValidation:
                     str_exists = ", ".join(collect_action.keys())
                     msg = "FAIL: In `{}` the `on_complete` action for `collect` must be a `redirect`.  You used a `{}` action".\
                         format(lbl, str_exists)
-                    echo_format_msg(msg)
+                    self.report(msg)
                     self.validation_pass = False
 
             # Check if actions are repeated in the task.
@@ -69,41 +81,55 @@ class InputValidation:
             for action, counts in action_counts.items():
                 if counts > 1:
                     msg = "FAIL: In task `{}` you have multiple `{}` actions. Can only have one.".format(lbl, action)
-                    echo_format_msg(msg)
+                    self.report(msg)
                     self.validation_pass = False
 
-        # Check if task has samples associated with it.
+        # Check if task has samples associated with it.  Samples given per language are checked for each language.
         try:
-            n_samples = len(task["samples"])
+            language_samples = task["samples"] if isinstance(task["samples"], dict) else {None: task["samples"]}
+
+            for language, samples in language_samples.items():
+                in_language = "" if language is None else " in `{}`".format(language)
+                n_samples = len(samples)
+
+                if n_samples == 0:
+                    msg = "FAIL: There are no samples{} provided for '{}'".format(in_language, lbl)
+                    self.report(msg)
+                    self.validation_pass = False
+                elif n_samples < 10:
+                    msg = "INFO: Task `{}` only has `{}` samples{}.  Recommended to have at least 10.".\
+                        format(lbl, str(n_samples), in_language)
+                    self.report(msg)
 
-            if n_samples == 0:
+            if not language_samples:
                 msg = "FAIL: There are no samples provided for '{}'".format(lbl)
-                echo_format_msg(msg)
+                self.report(msg)
                 self.validation_pass = False
-            elif n_samples < 10:
-                msg = "INFO: Task `{}` only has `{}` samples.  Recommended to have at least 10.".format(lbl, str(n_samples))
-                echo_format_msg(msg)
         except KeyError:
             msg = "FAIL: There are no samples provided for '{}'".format(lbl)
-            echo_format_msg(msg)
+            self.report(msg)
             self.validation_pass = False
 
         # Check that task fields are defined.
         for task_field in task.get("task_fields", []):
             if "unique_name" not in task_field:
                 msg = "FAIL: A task field in '{}' is missing a unique_name.".format(lbl)
-                echo_format_msg(msg)
+                self.report(msg)
                 self.validation_pass = False
 
             if "field_type" not in task_field:
                 msg = "FAIL: A task field in '{}' is missing a field_type.".format(lbl)
-                echo_format_msg(msg)
+                self.report(msg)
                 self.validation_pass = False
 
         # Make sure samples with custom fields have a defined field.
         missing_fields = []
         task_field_labels = [tf["unique_name"] for tf in task.get("task_fields", [])]
-        for sample in task.get("samples", []):
+        samples = task.get("samples", [])
+        if isinstance(samples, dict):
+            samples = [sample for language_samples in samples.values() for sample in language_samples]
+
+        for sample in samples:
             if isinstance(sample, dict):
                 sample = sample["tagged_text"]
 
@@ -115,9 +141,30 @@ class InputValidation:
             missing_fields_str = ", ".join(list(set(missing_fields)))
             msg = "FAIL: Task `{}` contains undefined custom fields.  Make sure your task includes these fields: `{}`".\
                 format(lbl, missing_fields_str)
-            echo_format_msg(msg)
+            self.report(msg)
             self.validation_pass = False
 
+    def validate_cached_task(self, lbl, task):
+        """
+        Validates a task, reusing the result of an earlier validation of an identical task when the task cache is
+        enabled.  Results are keyed by the content of the task, so they are shared across configurations and runs.
+        """
+        if self.task_cache is None:
+            return self.validate_task(lbl, task)
+
+        key = canonical_hash({"format": VALIDATION_FORMAT, "label": lbl, "task": task})
+        messages = self.task_cache.get_validation(key)
+
+        if messages is None:
+            n_messages = len(self.messages)
+            self.validate_task(lbl, task)
+            self.task_cache.set_validation(key, self.messages[n_messages:])
+        else:
+            for msg in messages:
+                self.report(msg)
+                if msg.startswith("FAIL"):
+                    self.validation_pass = False
+
     def validate_assistant(self, lbl, assistant):
         """
         Check the assistant for properly formatted input.
@@ -128,14 +175,14 @@ class InputValidation:
         if "defaults" in assistant:
             if "defaults" not in assistant["defaults"]:
                 msg = "FAIL: The `defaults` parameter for Assistant `{}` is not formed properly.".format(lbl)
-                echo_format_msg(msg)
+                self.report(msg)
                 self.validation_pass = False
             else:
                 if not all(x in assistant["defaults"]["defaults"] for x in ["assistant_initiation", "fallback"]):
                     msg = "INFO: For Assistant `defaults` to take effect you must minimally specify a " \
                           "default for `assistant_initiation` and `fallback`.  Check Assistant `{}` " \
                           "for missing parameters".format(lbl)
-                    echo_format_msg(msg)
+                    self.report(msg)
 
     def validate_field_type(self, lbl, assistant):
         """
@@ -145,29 +192,49 @@ class InputValidation:
         # Raise a warning if no values associated with a field type.
         if ("values" not in assistant) or (len(assistant["values"]) == 0):
             msg = "INFO: Custom Field Type `{}` has no values associated with it.".format(lbl)
-            echo_format_msg(msg)
+            self.report(msg)
+        elif isinstance(assistant["values"], dict):
+            for language, values in assistant["values"].items():
+                if len(values) == 0:
+                    msg = "INFO: Custom Field Type `{}` has no values in `{}`.".format(lbl, language)
+                    self.report(msg)
 
     def validate_input(self):
         """
         Performs the validation on the input configuration file.
         :return: Boolean indicating if a critical error is detected in the input file.
         """
+        return self.validate_resources(self.config.keys())
+
+    def validate_resource(self, tag, attributes):
+        """
+        Checks the tag specific criteria of a single resource in the configuration file.
+        """
+        echo("\nValidating `{}`...".format(tag))
+        if "unique_name" not in attributes:
+            msg = "FAIL: `{}` does not have a 'unique_name'".format(tag)
+            self.report(msg)
+            self.validation_pass = False
+
+        if tag.startswith("task__"):
+            self.validate_cached_task(tag, attributes)
+        elif tag == "assistant":
+            self.validate_assistant(tag, attributes)
+        elif tag.startswith("field_type__"):
+            self.validate_field_type(tag, attributes)
+
+    def validate_resources(self, tags):
+        """
+        Performs the validation on a subset of the resources in the configuration file.  The base file format is
+        always checked.
+        :param tags: The configuration keys of the resources to validate.
+        :return: Boolean indicating if a critical error is detected in the input file.
+        """
         self.required_parameters()
 
         # Iterate across tags to check tag specific criteria.
-        click.echo("\nCHECKING INDIVIDUAL RESOURCES...")
-        for tag, attributes in self.config.items():
-            click.echo("\nValidating `{}`...".format(tag))
-            if "unique_name" not in attributes:
-                msg = "FAIL: `{}` does not have a 'unique_name'".format(tag)
-                echo_format_msg(msg)
-                self.validation_pass = False
-
-            if tag.startswith("task__"):
-                self.validate_task(tag, attributes)
-            elif tag == "assistant":
-                self.validate_assistant(tag, attributes)
-            elif tag.startswith("field_type__"):
-                self.validate_field_type(tag, attributes)
+        echo("\nCHECKING INDIVIDUAL RESOURCES...")
+        for tag in tags:
+            self.validate_resource(tag, self.config[tag])
 
         return self.validation_pass
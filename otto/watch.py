@@ -0,0 +1,277 @@
+import os
+import time
+from requests.exceptions import RequestException
+from twilio.base.exceptions import TwilioException, TwilioRestException
+from otto.cache import TaskCache, canonical_hash
+from otto.config import CompiledConfig
+from otto.validate import InputValidation
+from otto.events import reporter
+from otto.utilities import echo, echo_format_msg, get_attribute_config_items
+from otto.resources import Assistant, FieldType, Task, ModelBuild, get_task_record
+
+# Errors from the Twilio API, or reaching it, that should not stop the watch.
+API_ERRORS = (TwilioException, RequestException)
+
+
+class ConfigWatcher:
+
+    def __init__(self, client, config_loc, interval=1.0, debounce=10.0, keep_builds=3):
+        """
+        Watches a configuration file, along with its includes and sample files, and incrementally pushes changes to
+        the deployed assistant.  Only resources that changed are validated and redeployed, and model builds are
+        debounced so a burst of edits results in a single training run.
+
+        :param client: The Twilio Client object used to deploy the assistant.
+        :param config_loc: str.  Location of the configuration file to watch.
+        :param interval: float.  Seconds between checks for changed files.
+        :param debounce: float.  Seconds without further changes before a new model is built.
+        :param keep_builds: int.  Number of most recent model builds to keep as new builds are trained.
+        """
+        self.client = client
+        self.config_loc = config_loc
+        self.interval = interval
+        self.debounce = debounce
+        self.keep_builds = keep_builds
+
+        self.assistant = None
+        self.deployed = {}
+        self.deployed_names = {}
+        self.watched = {}
+        self.build_due = None
+
+    def snapshot(self):
+        """
+        Gets the modification time of every watched file.  Files that cannot be found are recorded as None.
+        """
+        mtimes = {}
+        for loc in self.watched:
+            try:
+                mtimes[loc] = os.stat(loc).st_mtime
+            except OSError:
+                mtimes[loc] = None
+
+        return mtimes
+
+    def compile(self):
+        """
+        Recompiles the configuration and validates only the resources that differ from what is deployed.
+        :return: A tuple of the compiled configuration and the changed resource hashes, or None if the configuration is
+            invalid.
+        """
+        try:
+            compiled = CompiledConfig.load(self.config_loc, use_cache=False)
+        except (OSError, ValueError) as e:
+            echo_format_msg("FAIL: Unable to compile {}. {}".format(self.config_loc, e))
+            return None
+
+        self.watched = dict.fromkeys(compiled.inputs)
+
+        hashes = {k: canonical_hash(v) for (k, v) in compiled.config.items()}
+        changed = [k for (k, h) in hashes.items() if self.deployed.get(k) != h]
+
+        if not InputValidation(compiled.config).validate_resources(changed):
+            echo_format_msg("FAIL: Changes were not deployed.  See above for areas to improve.")
+            return None
+
+        compiled.save()
+
+        return compiled, {k: hashes[k] for k in changed}
+
+    def attempt(self, resource, action, name, func):
+        """
+        Makes the API calls for a single resource, reporting a failure instead of stopping the watch.
+        :param resource: str.  Type of resource acted on.
+        :param action: str.  Action taken on the resource.
+        :param name: str.  Unique name of the resource.
+        :param func: Function making the API calls.
+        :return: Boolean indicating if the calls succeeded.
+        """
+        try:
+            with reporter.timed(resource, action, name=name):
+                func()
+            return True
+        except API_ERRORS as e:
+            echo_format_msg("FAIL: Unable to {} {} `{}`. {}".format(action, resource, name, e))
+            return False
+
+    def teardown(self, resource_cls, unique_name):
+        """
+        Tears down a resource of the assistant.  A resource that no longer exists, for instance because it was deleted
+        in the Twilio console, is treated as already removed.
+        :param resource_cls: The Task or FieldType class of the resource.
+        :param unique_name: str.  Unique name of the resource.
+        """
+        try:
+            resource_cls(unique_name).teardown(self.assistant)
+        except TwilioRestException as e:
+            if e.status != 404:
+                raise
+
+    def sync(self, config, changed):
+        """
+        Pushes the changed resources to the assistant and removes resources no longer in the configuration.  Resources
+        that fail to deploy are left out of the deployed state so they are retried on the next change.
+        :param config: dict.  The compiled configuration.
+        :param changed: dict.  Configuration keys and hashes of the resources that changed.
+        :return: Boolean indicating if any change was deployed.
+        """
+        synced = False
+        switched = False
+
+        if self.assistant is None or "assistant" in changed:
+            assistant = Assistant(self.client.autopilot, **config["assistant"])
+            previous_assistant = self.assistant
+
+            def update_assistant():
+                self.assistant = assistant.fetch_or_create(teardown=False)
+
+            if not self.attempt("assistant", "update", assistant.unique_name, update_assistant):
+                return False
+
+            synced = True
+            echo_format_msg("COMPLETED: Assistant {} has been updated.".format(self.assistant.unique_name))
+
+            # Nothing has been deployed to a different assistant yet, so every resource is pushed to it.
+            switched = previous_assistant is not None and \
+                (previous_assistant.account_sid, previous_assistant.sid) != (self.assistant.account_sid,
+                                                                             self.assistant.sid)
+            if switched:
+                self.deployed = {}
+                self.deployed_names = {}
+                changed = {k: canonical_hash(v) for (k, v) in config.items()}
+
+        # Keep the record of deployed task content in step so a later deploy does not skip a task changed here.
+        task_cache = TaskCache()
+        task_records = {} if switched else task_cache.get_deployed(self.assistant)
+
+        # Field types are pushed first since tasks may reference them.
+        resource_types = [("field_type__", "field_type", "Custom field type", FieldType),
+                          ("task__", "task", "Task", Task)]
+        for prefix, resource, label, resource_cls in resource_types:
+            for key, definition in get_attribute_config_items(config, prefix).items():
+                if key not in changed:
+                    continue
+
+                # Remove the resource deployed under its previous name if it was renamed.
+                previous_name = self.deployed_names.get(key)
+                if previous_name is not None and previous_name != definition["unique_name"]:
+                    if not self.attempt(resource, "delete", previous_name,
+                                        lambda: self.teardown(resource_cls, previous_name)):
+                        continue
+
+                    self.deployed.pop(key, None)
+                    self.deployed_names.pop(key)
+                    task_records.pop(previous_name, None)
+                    echo_format_msg("COMPLETED: {} has been removed.".format(previous_name))
+
+                resource_obj = resource_cls(**definition)
+
+                def push():
+                    resource_obj.create(self.assistant)
+                    if resource == "task":
+                        task_records[resource_obj.unique_name] = get_task_record(
+                            self.assistant.tasks(resource_obj.unique_name).fetch(), resource_obj.content_hash())
+
+                # Any earlier record no longer describes the remote task once it starts being updated.
+                if resource == "task":
+                    task_records.pop(resource_obj.unique_name, None)
+                if not self.attempt(resource, "update", resource_obj.unique_name, push):
+                    continue
+
+                self.deployed[key] = changed[key]
+                self.deployed_names[key] = resource_obj.unique_name
+                synced = True
+                echo_format_msg("COMPLETED: {} {} has been updated.".format(label, resource_obj.unique_name))
+
+        # The assistant and model have nothing further to push.
+        for key in ["assistant", "model"]:
+            if key in changed:
+                self.deployed[key] = changed[key]
+                self.deployed_names[key] = config[key].get("unique_name")
+                synced = True
+
+        # Remove resources that were deleted from the configuration.
+        for removed_key in sorted(set(self.deployed) - set(config), key=lambda k: k.startswith("field_type__")):
+            removed_name = self.deployed_names[removed_key]
+            if removed_key.startswith("task__"):
+                if not self.attempt("task", "delete", removed_name, lambda: self.teardown(Task, removed_name)):
+                    continue
+                task_records.pop(removed_name, None)
+            elif removed_key.startswith("field_type__"):
+                if not self.attempt("field_type", "delete", removed_name,
+                                    lambda: self.teardown(FieldType, removed_name)):
+                    continue
+
+            self.deployed.pop(removed_key)
+            self.deployed_names.pop(removed_key)
+            synced = True
+            echo_format_msg("COMPLETED: {} has been removed.".format(removed_name))
+
+        task_cache.set_deployed(self.assistant, task_records)
+
+        return synced
+
+    def build(self, model_definition):
+        """
+        Trains a new model build for the assistant and prunes older builds.
+        :param model_definition: dict.  The `model` element of the configuration.
+        """
+        unique_name = "{}-{}".format(model_definition["unique_name"], int(time.time()))
+        with reporter.timed("model_build", "create", name=unique_name):
+            model = ModelBuild(unique_name).create(self.assistant)
+        msg = "COMPLETED: Model {} has been created.".format(model.unique_name)
+        echo_format_msg(msg)
+
+        with reporter.timed("model_build", "prune", name=self.assistant.unique_name):
+            stale = ModelBuild(model.unique_name).prune(self.assistant, keep=self.keep_builds)
+        if stale:
+            echo_format_msg("COMPLETED: Removed {} stale model build(s).".format(len(stale)))
+
+    def run(self, assume_deployed=False):
+        """
+        Watches for changes until interrupted.
+        :param assume_deployed: bool.  Treat the current configuration as already deployed instead of pushing every
+            resource on start.
+        """
+        self.watched = {os.path.abspath(self.config_loc): None}
+        mtimes = {}
+        config = None
+
+        while True:
+            current = self.snapshot()
+            if current != mtimes:
+                result = self.compile()
+                mtimes = self.snapshot()
+
+                if result is not None:
+                    compiled, changed = result
+                    config = compiled.config
+
+                    if assume_deployed:
+                        try:
+                            self.assistant = self.client.autopilot.assistants(config["assistant"]["unique_name"]).\
+                                fetch()
+                            self.deployed = {k: canonical_hash(v) for (k, v) in config.items()}
+                            self.deployed_names = {k: v.get("unique_name") for (k, v) in config.items()}
+                            assume_deployed = False
+                        except API_ERRORS as e:
+                            msg = "FAIL: Unable to fetch assistant `{}`.  Check the assistant has been deployed. {}".\
+                                format(config["assistant"]["unique_name"], e)
+                            echo_format_msg(msg)
+                    elif changed or set(self.deployed) - set(config):
+                        if self.sync(config, changed):
+                            self.build_due = time.time() + self.debounce
+                            echo("Waiting {} seconds for further changes before training...".format(self.debounce))
+                        reporter.write_metrics()
+
+                    echo("\nWatching {} for changes...".format(self.config_loc))
+
+            if self.build_due is not None and time.time() >= self.build_due:
+                self.build_due = None
+                try:
+                    self.build(config["model"])
+                except API_ERRORS as e:
+                    echo_format_msg("FAIL: Unable to build model `{}`. {}".format(config["model"]["unique_name"], e))
+                reporter.write_metrics()
+
+            time.sleep(self.interval)